@@ -3,13 +3,14 @@ import boto3
 import os
 from datetime import datetime
 
+s3_client = boto3.client('s3')
+
 def lambda_handler(event, context):
     """
     Enhanced health check endpoint for stitch service.
     Returns detailed system status information.
     """
     try:
-        s3_client = boto3.client('s3')
         bucket_name = os.environ.get('BUCKET_NAME')
         
         # Check S3 connectivity
@@ -16,6 +16,9 @@ PROCESSING_BUCKET = os.environ['STITCH_PROCESSING_BUCKET']
 CONVERTER_LAMBDA = os.environ['CONVERTER_LAMBDA_ARN']
 STATUS_TABLE = os.environ['STATUS_TABLE_NAME']
 
+# Reused across warm invocations
+status_table = dynamodb.Table(STATUS_TABLE)
+
 def lambda_handler(event, context):
     """
     Process GuardDuty scan results for Stitch files.
@@ -111,12 +114,9 @@ def lambda_handler(event, context):
         from datetime import datetime
         timestamp = datetime.utcnow().isoformat() + 'Z'
         
-        # Get DynamoDB table
-        table = dynamodb.Table(STATUS_TABLE)
-        
         # Get request details from DynamoDB
         try:
-            response = table.get_item(Key={'request_id': request_id})
+            response = status_table.get_item(Key={'request_id': request_id})
             if 'Item' not in response:
                 logger.error(f"Request not found in DynamoDB: {request_id}")
                 return {'statusCode': 404, 'body': 'Request not found'}
@@ -133,7 +133,7 @@ def lambda_handler(event, context):
             
             # Update status to converting
             try:
-                table.update_item(
+                status_table.update_item(
                     Key={'request_id': request_id},
                     UpdateExpression='SET #status = :status, #timestamp = :timestamp',
                     ExpressionAttributeNames={
@@ -167,7 +167,7 @@ def lambda_handler(event, context):
             except Exception as e:
                 logger.error(f"Failed to move file to processing bucket: {str(e)}")
                 # Update status to failed
-                table.update_item(
+                status_table.update_item(
                     Key={'request_id': request_id},
                     UpdateExpression='SET #status = :status, #error = :error',
                     ExpressionAttributeNames={
@@ -204,7 +204,7 @@ def lambda_handler(event, context):
             except Exception as e:
                 logger.error(f"Failed to invoke converter Lambda: {str(e)}")
                 # Update status to failed
-                table.update_item(
+                status_table.update_item(
                     Key={'request_id': request_id},
                     UpdateExpression='SET #status = :status, #error = :error',
                     ExpressionAttributeNames={
@@ -228,7 +228,7 @@ def lambda_handler(event, context):
             
             # Update status to infected
             try:
-                table.put_item(
+                status_table.put_item(
                     Item={
                         'request_id': request_id,
                         'status': 'infected',
@@ -275,8 +275,7 @@ def lambda_handler(event, context):
         # Try to update status to failed if we have a request_id
         try:
             if 'request_id' in locals() and request_id:
-                table = dynamodb.Table(STATUS_TABLE)
-                table.update_item(
+                status_table.update_item(
                     Key={'request_id': request_id},
                     UpdateExpression='SET #status = :status, #error = :error',
                     ExpressionAttributeNames={
@@ -288,7 +287,8 @@ def lambda_handler(event, context):
                         ':error': f'Callback processing error: {str(e)}'
                     }
                 )
-        except:
-            pass  # Don't fail on status update
+        except Exception as update_error:
+            # Don't fail on status update; the original error is re-raised below
+            logger.error(f"Failed to record failed status: {str(update_error)}")
         
         raise
@@ -9,6 +9,9 @@ logger.setLevel(logging.INFO)
 s3_client = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
 
+# Cached across warm invocations
+_STATUS_TABLE = None
+
 def lambda_handler(event, context):
     """
     Check conversion status for a request_id.
@@ -16,18 +19,19 @@ def lambda_handler(event, context):
     This endpoint allows the frontend to poll for conversion status
     and get download URLs when ready.
     """
+    global _STATUS_TABLE
     
     try:
         # Extract request_id from path parameters
         request_id = event['pathParameters']['request_id']
         logger.info(f"Checking status for request: {request_id}")
         
-        # Get DynamoDB table name from environment
-        table_name = os.environ['STATUS_TABLE_NAME']
-        table = dynamodb.Table(table_name)
+        # Get DynamoDB table from environment (once per container)
+        if _STATUS_TABLE is None:
+            _STATUS_TABLE = dynamodb.Table(os.environ['STATUS_TABLE_NAME'])
         
         # Query DynamoDB for status
-        response = table.get_item(Key={'request_id': request_id})
+        response = _STATUS_TABLE.get_item(Key={'request_id': request_id})
         
         if 'Item' not in response:
             logger.warning(f"Request not found: {request_id}")
@@ -12,7 +12,10 @@ import math
 import re
 import struct
 import logging
+from bisect import bisect_right
+from functools import lru_cache
 from typing import List, Tuple, Dict, Any, Optional
+import numpy as np
 
 # Set up logging
 logger = logging.getLogger()
@@ -63,10 +66,29 @@ except ImportError:
     PYEMBROIDERY_AVAILABLE = False
     print("Warning: pyembroidery library not available, using fallback conversion")
 
+# Spatial index for stitch ordering, fall back to brute-force distances
+try:
+    from scipy.spatial import cKDTree
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+    print("Warning: scipy not available, using brute-force stitch ordering")
+
+# Faster JSON serialization for response bodies
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    print("Warning: orjson not available, using standard json")
+
 s3_client = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'urgd-stitch-storage')
 
+# Cached across warm invocations
+_STATUS_TABLE = None
+
 # High quality settings for professional embroidery
 PROFESSIONAL_SETTINGS = {
     'fill_density': 2.5,  # 2.5mm between rows (10 SPI) - high quality
@@ -83,6 +105,46 @@ PROFESSIONAL_SETTINGS = {
     'quality_level': 'high'  # high quality for professional results
 }
 
+# PES (and pyembroidery) coordinates are integers in 0.1mm units
+PES_UNITS_PER_MM = 10
+
+# Unit circle sampled at 32 points (33 to close the outline), shared by
+# the circle and ellipse approximations
+_CIRCLE_ANGLES = np.linspace(0, 2 * np.pi, 33)
+_UNIT_COS = np.cos(_CIRCLE_ANGLES)
+_UNIT_SIN = np.sin(_CIRCLE_ANGLES)
+
+# Fixed header for the minimal PES writer
+_PES_HEADER = (
+    b'#PES0060'          # PES version 6.0
+    b'\x00\x00\x00\x00'  # Reserved
+    b'\x01\x00'          # Hoop count
+    b'\x00\x00'          # Reserved
+    b'\x64\x00'          # Width (100mm)
+    b'\x64\x00'          # Height (100mm)
+    b'\x00\x00\x00\x00'  # Reserved
+)
+
+# Width and height (0.1mm units) at offset 16 of the minimal writer's header
+_PES_DIMENSIONS = struct.Struct('<HH')
+
+# Signature and PEC section offset at the start of a PES file
+_PES_PREFIX = struct.Struct('<4s4xI')
+
+# Stitch count thresholds and the (complexity, level) for each band
+_QUALITY_BINS = (20, 100, 300, 1000, 3000)
+_QUALITY_BANDS = (
+    ("very_simple", "basic"),
+    ("simple", "basic"),
+    ("moderate", "good"),
+    ("complex", "high"),
+    ("highly_complex", "high"),
+    ("highly_complex", "professional"),
+)
+
+# A number in an SVG attribute such as polygon points
+_SVG_NUMBER = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+
 def lambda_handler(event, context):
     """
     Lambda handler for SVG to PES conversion.
@@ -104,7 +166,7 @@ def lambda_handler(event, context):
             return {
                 'statusCode': 400,
                 'headers': get_cors_headers(),
-                'body': json.dumps({'error': 'Invalid event structure'})
+                'body': _dumps({'error': 'Invalid event structure'})
             }
             
     except Exception as e:
@@ -113,7 +175,7 @@ def lambda_handler(event, context):
         return {
             'statusCode': 500,
             'headers': get_cors_headers(),
-            'body': json.dumps({'error': 'Internal server error'})
+            'body': _dumps({'error': 'Internal server error'})
         }
 
 def handle_sync_conversion(event, context):
@@ -143,7 +205,7 @@ def handle_sync_conversion(event, context):
             return {
                 'statusCode': 405,
                 'headers': get_cors_headers(),
-                'body': json.dumps({'error': 'Method not allowed'})
+                'body': _dumps({'error': 'Method not allowed'})
             }
             
     except Exception as e:
@@ -152,7 +214,7 @@ def handle_sync_conversion(event, context):
         return {
             'statusCode': 500,
             'headers': get_cors_headers(),
-            'body': json.dumps({'error': 'Internal server error'})
+            'body': _dumps({'error': 'Internal server error'})
         }
 
 def handle_async_conversion(event, context):
@@ -226,13 +288,17 @@ def handle_async_conversion(event, context):
 
 def update_status(request_id, status, additional_data=None):
     """Update conversion status in DynamoDB."""
+    global _STATUS_TABLE
+    
     try:
-        table_name = os.environ.get('STATUS_TABLE_NAME')
-        if not table_name:
-            logger.warning("STATUS_TABLE_NAME not set, skipping status update")
-            return
-        
-        table = dynamodb.Table(table_name)
+        if _STATUS_TABLE is None:
+            table_name = os.environ.get('STATUS_TABLE_NAME')
+            if not table_name:
+                logger.warning("STATUS_TABLE_NAME not set, skipping status update")
+                return
+            
+            # Get DynamoDB table (once per container)
+            _STATUS_TABLE = dynamodb.Table(table_name)
         
         update_expression = 'SET #status = :status, #timestamp = :timestamp'
         expression_attribute_names = {
@@ -250,7 +316,7 @@ def update_status(request_id, status, additional_data=None):
                 expression_attribute_names[f'#{key}'] = key
                 expression_attribute_values[f':{key}'] = value
         
-        table.update_item(
+        _STATUS_TABLE.update_item(
             Key={'request_id': request_id},
             UpdateExpression=update_expression,
             ExpressionAttributeNames=expression_attribute_names,
@@ -271,7 +337,7 @@ def handle_conversion(event, context):
             return {
                 'statusCode': 400,
                 'headers': get_cors_headers(),
-                'body': json.dumps({'error': 'No file provided'})
+                'body': _dumps({'error': 'No file provided'})
             }
         
         # For Lambda Function URL, the body is base64 encoded
@@ -286,7 +352,7 @@ def handle_conversion(event, context):
             return {
                 'statusCode': 400,
                 'headers': get_cors_headers(),
-                'body': json.dumps({'error': 'Invalid SVG file'})
+                'body': _dumps({'error': 'Invalid SVG file'})
             }
         
         # Convert SVG to PES with professional quality
@@ -296,7 +362,7 @@ def handle_conversion(event, context):
             return {
                 'statusCode': 500,
                 'headers': get_cors_headers(),
-                'body': json.dumps({'error': 'Conversion failed'})
+                'body': _dumps({'error': 'Conversion failed'})
             }
         
         # Upload PES file to S3 and get presigned URL
@@ -326,7 +392,7 @@ def handle_conversion(event, context):
         return {
             'statusCode': 200,
             'headers': get_cors_headers(),
-            'body': json.dumps({
+            'body': _dumps({
                 'success': True,
                 'downloadUrl': download_url,
                 'message': f'File converted successfully with {quality_assessment["level"]} quality',
@@ -343,7 +409,7 @@ def handle_conversion(event, context):
         return {
             'statusCode': 500,
             'headers': get_cors_headers(),
-            'body': json.dumps({'error': 'Conversion failed: ' + str(e)})
+            'body': _dumps({'error': 'Conversion failed: ' + str(e)})
         }
 
 def parse_multipart_data(body):
@@ -536,130 +602,119 @@ def parse_basic_path(path_data: str) -> List[Tuple[float, float]]:
         print(f"Error in basic path parsing: {e}")
         return []
 
-def scale_coordinates(coords: List[Tuple[float, float]], svg_width: float, svg_height: float, target_width: float = 100) -> List[Tuple[float, float]]:
-    """Scale SVG coordinates to embroidery millimeters."""
-    if not coords:
-        return []
+def scale_coordinates(coords: List[Tuple[float, float]], svg_width: float, svg_height: float, target_width: float = 100) -> np.ndarray:
+    """Scale SVG coordinates to embroidery units.
+    
+    target_width is in millimeters; the result is an (N, 2) int32 array in
+    PES units (0.1mm). Points that are not finite are dropped.
+    """
+    if len(coords) == 0:
+        return np.empty((0, 2), dtype=np.int32)
     
     # Calculate scale factor to fit within target width
     scale_x = target_width / svg_width
     scale_y = target_width / svg_height
     scale = min(scale_x, scale_y)  # Maintain aspect ratio
     
-    scaled_coords = []
-    for x, y in coords:
-        scaled_x = x * scale
-        scaled_y = y * scale
-        scaled_coords.append((scaled_x, scaled_y))
+    scaled = np.asarray(coords, dtype=np.float64) * (scale * PES_UNITS_PER_MM)
+    scaled = scaled[np.isfinite(scaled).all(axis=1)]
     
-    return scaled_coords
+    return np.rint(scaled).astype(np.int32)
 
-def generate_fill_stitches(coords: List[Tuple[float, float]], angle: float = None, density: float = None) -> List[Tuple[float, float]]:
+def generate_fill_stitches(coords: List[Tuple[float, float]], angle: float = None, density: float = None) -> np.ndarray:
     """Create professional-quality tatami fill pattern with underlay stitches."""
     if len(coords) < 3:
-        return []
+        return np.empty((0, 2), dtype=np.int32)
     
-    # Use professional settings
+    # Use professional settings (converted from mm to PES units)
     settings = PROFESSIONAL_SETTINGS
-    row_spacing = settings['fill_density']
-    stitch_length = settings['fill_stitch_length']
+    row_spacing = round(settings['fill_density'] * PES_UNITS_PER_MM)
+    stitch_length = round(settings['fill_stitch_length'] * PES_UNITS_PER_MM)
     fill_angle = angle or settings['fill_angle']
     
-    # Calculate bounding box
-    min_x = min(x for x, y in coords)
-    max_x = max(x for x, y in coords)
-    min_y = min(y for x, y in coords)
-    max_y = max(y for x, y in coords)
-    
     # Generate underlay stitches first (perpendicular to fill direction)
     underlay_stitches = generate_underlay_stitches(coords, fill_angle + 90)
     
     # Generate main fill stitches
-    fill_stitches = []
+    fill_stitches = generate_row_stitches(coords, row_spacing, stitch_length)
     
-    # Calculate number of rows based on professional density
-    num_rows = max(1, int((max_y - min_y) / row_spacing) + 1)
-    
-    for i in range(num_rows):
-        y = min_y + i * row_spacing
-        if y > max_y:
-            break
-            
-        # Generate horizontal line across the shape
-        for x in range(int(min_x), int(max_x) + 1, int(stitch_length)):
-            px, py = x, y
-            if min_x < px < max_x and min_y < py < max_y:
-                # Check if point is inside the shape
-                if is_point_in_polygon((px, py), coords):
-                    fill_stitches.append((px, py))
-    
-    # Combine underlay and fill stitches
-    all_stitches = underlay_stitches + fill_stitches
-    
-    # Limit total stitches for performance
-    if len(all_stitches) > settings['max_stitches_per_block']:
-        all_stitches = all_stitches[:settings['max_stitches_per_block']]
-    
-    return all_stitches
+    # Combine underlay and fill stitches, limiting total stitches for performance
+    all_stitches = np.concatenate([underlay_stitches, fill_stitches], axis=0)
+    return all_stitches[:settings['max_stitches_per_block']]
 
-def generate_underlay_stitches(coords: List[Tuple[float, float]], angle: float) -> List[Tuple[float, float]]:
+def generate_underlay_stitches(coords: List[Tuple[float, float]], angle: float) -> np.ndarray:
     """Generate underlay stitches for better fabric stability."""
     if len(coords) < 3:
-        return []
+        return np.empty((0, 2), dtype=np.int32)
     
     settings = PROFESSIONAL_SETTINGS
-    row_spacing = settings['underlay_density']
+    row_spacing = round(settings['underlay_density'] * PES_UNITS_PER_MM)
+    
+    # Wider spacing for underlay (3mm)
+    return generate_row_stitches(coords, row_spacing, 3 * PES_UNITS_PER_MM)
+
+def generate_row_stitches(coords: np.ndarray, row_spacing: int, stitch_spacing: int) -> np.ndarray:
+    """Lay out horizontal stitch rows across the shape's bounding box, keeping points inside it.
+    
+    Coordinates and spacings are in PES units. Returns an (N, 2) int32 array
+    ordered row by row.
+    """
+    polygon = np.asarray(coords, dtype=np.int32)
     
     # Calculate bounding box
-    min_x = min(x for x, y in coords)
-    max_x = max(x for x, y in coords)
-    min_y = min(y for x, y in coords)
-    max_y = max(y for x, y in coords)
+    min_x, min_y = polygon.min(axis=0)
+    max_x, max_y = polygon.max(axis=0)
     
-    underlay_stitches = []
+    # Calculate number of rows based on density
+    num_rows = max(1, int((max_y - min_y) // row_spacing) + 1)
+    ys = min_y + np.arange(num_rows, dtype=np.int32) * row_spacing
+    ys = ys[(ys > min_y) & (ys < max_y)]
     
-    # Generate underlay lines
-    num_rows = max(1, int((max_y - min_y) / row_spacing) + 1)
+    xs = np.arange(min_x, max_x + 1, stitch_spacing, dtype=np.int32)
+    xs = xs[(xs > min_x) & (xs < max_x)]
     
-    for i in range(num_rows):
-        y = min_y + i * row_spacing
-        if y > max_y:
-            break
-            
-        # Generate underlay line
-        for x in range(int(min_x), int(max_x) + 1, 3):  # Wider spacing for underlay
-            px, py = x, y
-            if min_x < px < max_x and min_y < py < max_y:
-                if is_point_in_polygon((px, py), coords):
-                    underlay_stitches.append((px, py))
-    
-    return underlay_stitches
+    # Build the whole grid at once, then keep only points inside the shape
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    points = np.column_stack((grid_x.ravel(), grid_y.ravel()))
+    inside = points_in_polygon(points, polygon)
+    
+    return points[inside]
 
-def is_point_in_polygon(point: Tuple[float, float], polygon: List[Tuple[float, float]]) -> bool:
-    """Check if a point is inside a polygon using ray casting algorithm."""
-    x, y = point
-    n = len(polygon)
-    inside = False
-    
-    p1x, p1y = polygon[0]
-    for i in range(1, n + 1):
-        p2x, p2y = polygon[i % n]
-        if y > min(p1y, p2y):
-            if y <= max(p1y, p2y):
-                if x <= max(p1x, p2x):
-                    if p1y != p2y:
-                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                    if p1x == p2x or x <= xinters:
-                        inside = not inside
+def points_in_polygon(points: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """Check which points are inside a polygon using ray casting algorithm.
+    
+    Returns a boolean mask with one entry per point.
+    """
+    # Work in float64 so the edge products cannot overflow int32 coordinates
+    points = np.asarray(points, dtype=np.float64)
+    x = points[:, 0]
+    y = points[:, 1]
+    inside = np.zeros(len(points), dtype=bool)
+    
+    vertices = np.asarray(polygon, dtype=np.float64).tolist()
+    p1x, p1y = vertices[0]
+    for i in range(1, len(vertices) + 1):
+        p2x, p2y = vertices[i % len(vertices)]
+        # Horizontal edges can never be crossed by a horizontal ray
+        if p1y != p2y:
+            crosses = (y > min(p1y, p2y)) & (y <= max(p1y, p2y)) & (x <= max(p1x, p2x))
+            if p1x != p2x:
+                xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+                crosses &= x <= xinters
+            inside ^= crosses
         p1x, p1y = p2x, p2y
     
     return inside
 
-def generate_satin_stitches(coords: List[Tuple[float, float]], width: float = 2) -> List[Tuple[float, float]]:
-    """Create satin stitch for narrow filled areas with improved quality."""
+def generate_satin_stitches(coords: np.ndarray, width: float = 2) -> np.ndarray:
+    """Create satin stitch for narrow filled areas with improved quality.
+    
+    Coordinates are in PES units and width is in millimeters.
+    """
     if len(coords) < 2:
-        return []
+        return np.empty((0, 2), dtype=np.int32)
     
+    coords = np.asarray(coords).tolist()
     satin_stitches = []
     
     # Calculate the path length
@@ -671,7 +726,7 @@ def generate_satin_stitches(coords: List[Tuple[float, float]], width: float = 2)
     
     # Calculate number of stitches needed based on professional settings
     settings = PROFESSIONAL_SETTINGS
-    stitch_length = settings['satin_stitch_length']
+    stitch_length = settings['satin_stitch_length'] * PES_UNITS_PER_MM
     num_stitches = max(2, int(total_length / stitch_length))
     
     # Generate zigzag pattern
@@ -687,6 +742,10 @@ def generate_satin_stitches(coords: List[Tuple[float, float]], width: float = 2)
             x2, y2 = coords[j + 1]
             segment_length = math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
             
+            # Points rounded to PES units can coincide; nothing to interpolate
+            if segment_length == 0:
+                continue
+            
             if current_length + segment_length >= target_length:
                 # Interpolate along this segment
                 local_t = (target_length - current_length) / segment_length
@@ -702,7 +761,7 @@ def generate_satin_stitches(coords: List[Tuple[float, float]], width: float = 2)
                     perp_y = dx / length
                     
                     # Zigzag pattern
-                    offset = width * 0.5 * (1 if i % 2 == 0 else -1)
+                    offset = width * PES_UNITS_PER_MM * 0.5 * (1 if i % 2 == 0 else -1)
                     final_x = x + perp_x * offset
                     final_y = y + perp_y * offset
                     
@@ -711,34 +770,114 @@ def generate_satin_stitches(coords: List[Tuple[float, float]], width: float = 2)
             
             current_length += segment_length
     
-    return satin_stitches
+    return np.rint(np.array(satin_stitches, dtype=np.float64).reshape(-1, 2)).astype(np.int32)
 
-def optimize_stitch_order(stitch_blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Reorder stitch groups to minimize travel distance and thread jumps."""
+def optimize_stitch_order(stitch_blocks: List[Dict[str, Any]], endpoints: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+    """Reorder stitch groups to minimize travel distance and thread jumps.
+    
+    endpoints is an optional (N, 2, 2) array holding the first and last
+    stitch of each block; it is built from the blocks when not given.
+    """
     if not stitch_blocks:
         return []
     
+    if endpoints is None:
+        endpoints = block_endpoints(stitch_blocks)
+    
     # Group by color, then minimize distance within groups
     optimized = []
     color_groups = {}
     
-    for block in stitch_blocks:
+    for i, block in enumerate(stitch_blocks):
         color = block.get('color', 'black')
         if color not in color_groups:
             color_groups[color] = []
-        color_groups[color].append(block)
+        color_groups[color].append(i)
     
-    # Process each color group
-    for color, blocks in color_groups.items():
-        if not blocks:
+    # Process each color group, continuing from where the previous one ended
+    position = None
+    for color, indices in color_groups.items():
+        if not indices:
             continue
         
-        # Sort blocks by starting position (simple optimization)
-        blocks.sort(key=lambda b: b.get('start_pos', (0, 0)))
-        optimized.extend(blocks)
+        blocks = [stitch_blocks[i] for i in indices]
+        ordered = order_blocks_nearest_neighbor(blocks, position, endpoints[indices])
+        position = ordered[-1]['stitches'][-1]
+        optimized.extend(ordered)
     
     return optimized
 
+def block_endpoints(stitch_blocks: List[Dict[str, Any]]) -> np.ndarray:
+    """Pack the first and last stitch of every block into one (N, 2, 2) array."""
+    return np.asarray([[block['stitches'][0], block['stitches'][-1]] for block in stitch_blocks], dtype=np.float32)
+
+def order_blocks_nearest_neighbor(blocks: List[Dict[str, Any]], position=None, endpoints=None) -> List[Dict[str, Any]]:
+    """Chain blocks greedily so each one starts as close as possible to where the last ended.
+    
+    Stroke blocks may be sewn in either direction and closed strokes are
+    rotated to start at their vertex nearest the needle. Fill blocks always
+    start at their first stitch so underlay is sewn before the top fill.
+    The first block is the one nearest to position, or the one with the
+    lowest start position when there is none.
+    """
+    count = len(blocks)
+    if endpoints is None:
+        endpoints = block_endpoints(blocks)
+    
+    # Entry points: row i is the start of block i, row count + i is its end
+    starts = endpoints[:, 0]
+    entries = np.concatenate([starts, endpoints[:, 1]], axis=0)
+    reversible = np.array([block.get('type') == 'stroke' for block in blocks])
+    # Entries still open; both entries of a block close once it is sewn
+    available = np.concatenate([np.ones(count, dtype=bool), reversible])
+    tree = cKDTree(entries) if SCIPY_AVAILABLE else None
+    
+    def nearest_entry(point):
+        if tree is None:
+            distances = np.sum((entries - point) ** 2, axis=1)
+            distances[~available] = np.inf
+            return int(np.argmin(distances))
+        
+        # Widen the query until it reaches an entry that is still available
+        k = min(8, len(entries))
+        while True:
+            _, indices = tree.query(point, k=k)
+            for index in np.atleast_1d(indices).tolist():
+                if available[index]:
+                    return index
+            k = min(k * 2, len(entries))
+    
+    if position is None:
+        entry = int(np.lexsort((starts[:, 1], starts[:, 0]))[0])
+    else:
+        entry = nearest_entry(np.asarray(position, dtype=np.float64))
+    
+    ordered = []
+    while True:
+        index = entry % count
+        block = blocks[index]
+        stitches = block['stitches']
+        
+        if entry >= count:
+            stitches = stitches[::-1]
+        
+        # Closed strokes can be entered at any vertex
+        if reversible[index] and position is not None and np.array_equal(stitches[0], stitches[-1]):
+            offsets = np.asarray(stitches, dtype=np.float64) - np.asarray(position, dtype=np.float64)
+            nearest = int(np.argmin(np.sum(offsets[:-1] ** 2, axis=1)))
+            stitches = np.concatenate([stitches[nearest:-1], stitches[:nearest + 1]], axis=0)
+        
+        if stitches is not block['stitches']:
+            block = {**block, 'stitches': stitches}
+        
+        ordered.append(block)
+        available[index] = available[count + index] = False
+        if len(ordered) == count:
+            return ordered
+        
+        position = stitches[-1]
+        entry = nearest_entry(np.asarray(position, dtype=np.float64))
+
 def convert_svg_to_pes(svg_content):
     """Convert SVG content to PES format with improved quality."""
     try:
@@ -781,167 +920,139 @@ def convert_svg_to_pes(svg_content):
         # Fallback to simple PES file
         return create_simple_pes_file(svg_content)
 
-def add_svg_to_pattern(pattern, svg_content):
-    """Add SVG content to embroidery pattern with full conversion logic."""
-    try:
-        # Extract SVG elements
-        elements = extract_svg_elements(svg_content)
-        if not elements:
-            print("No drawable elements found in SVG")
-            return
-        
-        # Track colors used
-        colors_used = set()
-        stitch_blocks = []
-        
-        for i, element in enumerate(elements):
-            try:
-                # Convert element to coordinates
-                coords = convert_element_to_coordinates(element)
-                if not coords:
-                    continue
-                
-                # Scale coordinates to embroidery size
-                coords = scale_coordinates(coords, element['svg_width'], element['svg_height'])
-                
-                # Determine stitch type and generate stitches
-                fill_color = element.get('fill', 'none')
-                stroke_color = element.get('stroke', 'none')
-                stroke_width = element.get('stroke_width', 1)
-                
-                # Process fill
-                if fill_color and fill_color != 'none':
-                    fill_coords = coords
-                    if len(fill_coords) >= 3:  # Closed shape
-                        # Determine if satin or fill based on professional standards
-                        width = calculate_shape_width(fill_coords)
-                        if width <= PROFESSIONAL_SETTINGS['satin_width_threshold']:
-                            # Use satin stitch for narrow shapes
-                            fill_stitches = generate_satin_stitches(fill_coords, width)
-                        else:
-                            # Use professional tatami fill for wide shapes
-                            fill_stitches = generate_fill_stitches(fill_coords)
-                        
-                        if fill_stitches:
-                            stitch_blocks.append({
-                                'stitches': fill_stitches,
-                                'color': fill_color,
-                                'type': 'fill',
-                                'start_pos': fill_stitches[0] if fill_stitches else (0, 0)
-                            })
-                            colors_used.add(fill_color)
-                
-                # Process stroke
-                if stroke_color and stroke_color != 'none' and stroke_width > 0:
-                    # Generate running stitch along path
-                    running_stitches = generate_running_stitches(coords, 2.5)  # 2.5mm stitch length
+@lru_cache(maxsize=1)
+def compute_stitch_blocks(svg_content):
+    """Convert SVG content to stitch blocks and thread colors in order of first use.
+    
+    The last result is cached so the PES fallback path can reuse it; the
+    returned arrays are read-only.
+    """
+    # Extract SVG elements
+    elements = extract_svg_elements(svg_content)
+    if not elements:
+        print("No drawable elements found in SVG")
+        return (), ()
+    
+    # Track colors used, mapped to thread index in order of first use
+    color_to_idx = {}
+    stitch_blocks = []
+    
+    for i, element in enumerate(elements):
+        try:
+            # Convert element to coordinates
+            coords = convert_element_to_coordinates(element)
+            if len(coords) == 0:
+                continue
+            
+            # Scale coordinates to embroidery size (PES units)
+            coords = scale_coordinates(coords, element['svg_width'], element['svg_height'])
+            
+            # Determine stitch type and generate stitches
+            fill_color = element.get('fill', 'none')
+            stroke_color = element.get('stroke', 'none')
+            stroke_width = element.get('stroke_width', 1)
+            
+            # Process fill
+            if fill_color and fill_color != 'none':
+                fill_coords = coords
+                if len(fill_coords) >= 3:  # Closed shape
+                    # Determine if satin or fill based on professional standards
+                    width = calculate_shape_width(fill_coords)
+                    if width <= PROFESSIONAL_SETTINGS['satin_width_threshold']:
+                        # Use satin stitch for narrow shapes
+                        fill_stitches = generate_satin_stitches(fill_coords, width)
+                    else:
+                        # Use professional tatami fill for wide shapes
+                        fill_stitches = generate_fill_stitches(fill_coords)
                     
-                    if running_stitches:
+                    if len(fill_stitches):
+                        fill_stitches.setflags(write=False)
                         stitch_blocks.append({
-                            'stitches': running_stitches,
-                            'color': stroke_color,
-                            'type': 'stroke',
-                            'start_pos': running_stitches[0] if running_stitches else (0, 0)
+                            'stitches': fill_stitches,
+                            'color': fill_color,
+                            'type': 'fill'
                         })
-                        colors_used.add(stroke_color)
+                        color_to_idx.setdefault(fill_color, len(color_to_idx))
+            
+            # Process stroke
+            if stroke_color and stroke_color != 'none' and stroke_width > 0:
+                # Generate running stitch along path
+                running_stitches = generate_running_stitches(coords, 2.5)  # 2.5mm stitch length
                 
-            except Exception as e:
-                print(f"Error processing element: {e}")
-                continue
+                if len(running_stitches):
+                    running_stitches.setflags(write=False)
+                    stitch_blocks.append({
+                        'stitches': running_stitches,
+                        'color': stroke_color,
+                        'type': 'stroke'
+                    })
+                    color_to_idx.setdefault(stroke_color, len(color_to_idx))
+            
+        except Exception as e:
+            print(f"Error processing element: {e}")
+            continue
+    
+    return tuple(stitch_blocks), tuple(color_to_idx)
+
+def add_svg_to_pattern(pattern, svg_content):
+    """Add SVG content to embroidery pattern with full conversion logic."""
+    try:
+        stitch_blocks, colors = compute_stitch_blocks(svg_content)
+        if not stitch_blocks:
+            return
         
         # Add thread colors to pattern
-        for i, color in enumerate(colors_used):
+        for i, color in enumerate(colors):
             pattern.add_thread({
                 "hex": color if color.startswith('#') else f"#{color}",
                 "name": f"Thread {i+1}"
             })
         
         # Optimize stitch order
-        stitch_blocks = optimize_stitch_order(stitch_blocks)
+        stitch_blocks = optimize_stitch_order(list(stitch_blocks))
         
         # Add stitches to pattern
         current_color = None
         
-        # Ensure pattern has proper bounds to prevent division by zero
-        if stitch_blocks:
-            all_stitches = []
-            for block in stitch_blocks:
-                all_stitches.extend(block['stitches'])
-            
-            if all_stitches:
-                min_x = min(x for x, y in all_stitches)
-                max_x = max(x for x, y in all_stitches)
-                min_y = min(y for x, y in all_stitches)
-                max_y = max(y for x, y in all_stitches)
-                
-                # Calculate pattern dimensions
-                width = max_x - min_x
-                height = max_y - min_y
-                
-                # Ensure minimum dimensions to prevent division by zero
-                min_dimension = 10.0  # Minimum 10mm in each dimension
-                if width < min_dimension:
-                    # Expand width
-                    center_x = (min_x + max_x) / 2
-                    min_x = center_x - min_dimension / 2
-                    max_x = center_x + min_dimension / 2
-                
-                if height < min_dimension:
-                    # Expand height
-                    center_y = (min_y + max_y) / 2
-                    min_y = center_y - min_dimension / 2
-                    max_y = center_y + min_dimension / 2
-                
-                # Add corner stitches to ensure proper bounds
-                pattern.add_stitch_absolute(min_x, min_y, pyembroidery.JUMP)
-                pattern.add_stitch_absolute(max_x, min_y, pyembroidery.STITCH)
-                pattern.add_stitch_absolute(max_x, max_y, pyembroidery.STITCH)
-                pattern.add_stitch_absolute(min_x, max_y, pyembroidery.STITCH)
-                pattern.add_stitch_absolute(min_x, min_y, pyembroidery.STITCH)
-                pattern.add_stitch_absolute(min_x, min_y, pyembroidery.TRIM)
-        
         for block_idx, block in enumerate(stitch_blocks):
             color = block['color']
             stitches = block['stitches']
             
-            # Add color change if needed
-            if current_color != color:
-                pattern.add_stitch_absolute(0, 0, pyembroidery.COLOR_CHANGE)
-                current_color = color
+            # Add color change between threads; the first block uses the first thread
+            if current_color is not None and current_color != color:
+                pattern.add_stitch_absolute(pyembroidery.COLOR_CHANGE, 0, 0)
+            current_color = color
             
-            # Add stitches
-            for i, (x, y) in enumerate(stitches):
-                # Validate coordinates
-                if not isinstance(x, (int, float)) or not isinstance(y, (int, float)):
-                    continue
-                if math.isnan(x) or math.isnan(y) or math.isinf(x) or math.isinf(y):
-                    continue
-                
-                if i == 0:
-                    # First stitch - jump to position
-                    pattern.add_stitch_absolute(x, y, pyembroidery.JUMP)
-                else:
-                    # Regular stitch
-                    pattern.add_stitch_absolute(x, y, pyembroidery.STITCH)
+            # Generators return non-empty int32 arrays built from finite,
+            # scaled coordinates, so no per-point validation is needed
+            points = np.asarray(stitches)
+            
+            # First stitch jumps to position, the rest are regular stitches
+            commands = np.full(len(points), pyembroidery.STITCH, dtype=np.int64)
+            commands[0] = pyembroidery.JUMP
+            
+            # Append [x, y, cmd] rows straight into pyembroidery's stitch list
+            pattern.stitches.extend(np.column_stack((points, commands)).tolist())
+            x, y = points[-1].tolist()
             
             # Add trim between different stitch blocks
-            if block != stitch_blocks[-1]:
-                pattern.add_stitch_absolute(x, y, pyembroidery.TRIM)
+            if block_idx < len(stitch_blocks) - 1:
+                pattern.add_stitch_absolute(pyembroidery.TRIM, x, y)
         
         # End pattern
         if stitch_blocks:
-            last_x, last_y = stitch_blocks[-1]['stitches'][-1]
-            pattern.add_stitch_absolute(last_x, last_y, pyembroidery.END)
+            last_x, last_y = stitch_blocks[-1]['stitches'][-1].tolist()
+            pattern.add_stitch_absolute(pyembroidery.END, last_x, last_y)
         
     except Exception as e:
         print(f"Error in add_svg_to_pattern: {e}")
         # Fallback to simple rectangle
-        pattern.add_stitch_absolute(0, 0, pyembroidery.STITCH)
-        pattern.add_stitch_absolute(100, 0, pyembroidery.STITCH)
-        pattern.add_stitch_absolute(100, 100, pyembroidery.STITCH)
-        pattern.add_stitch_absolute(0, 100, pyembroidery.STITCH)
-        pattern.add_stitch_absolute(0, 0, pyembroidery.STITCH)
-        pattern.add_stitch_absolute(0, 0, pyembroidery.END)
+        pattern.add_stitch_absolute(pyembroidery.STITCH, 0, 0)
+        pattern.add_stitch_absolute(pyembroidery.STITCH, 100, 0)
+        pattern.add_stitch_absolute(pyembroidery.STITCH, 100, 100)
+        pattern.add_stitch_absolute(pyembroidery.STITCH, 0, 100)
+        pattern.add_stitch_absolute(pyembroidery.STITCH, 0, 0)
+        pattern.add_stitch_absolute(pyembroidery.END, 0, 0)
 
 def convert_element_to_coordinates(element):
     """Convert SVG element to coordinate list based on element type."""
@@ -980,30 +1091,16 @@ def convert_circle_to_coordinates(element):
     cx, cy = element['cx'], element['cy']
     r = element['r']
     
-    # Approximate circle with 32 points
-    coords = []
-    for i in range(33):  # 33 points to close the circle
-        angle = 2 * math.pi * i / 32
-        x = cx + r * math.cos(angle)
-        y = cy + r * math.sin(angle)
-        coords.append((x, y))
-    
-    return coords
+    # Approximate circle with 32 points (33 to close the circle)
+    return np.column_stack((cx + r * _UNIT_COS, cy + r * _UNIT_SIN))
 
 def convert_ellipse_to_coordinates(element):
     """Convert ellipse to coordinate list (approximated as polygon)."""
     cx, cy = element['cx'], element['cy']
     rx, ry = element['rx'], element['ry']
     
-    # Approximate ellipse with 32 points
-    coords = []
-    for i in range(33):  # 33 points to close the ellipse
-        angle = 2 * math.pi * i / 32
-        x = cx + rx * math.cos(angle)
-        y = cy + ry * math.sin(angle)
-        coords.append((x, y))
-    
-    return coords
+    # Approximate ellipse with 32 points (33 to close the ellipse)
+    return np.column_stack((cx + rx * _UNIT_COS, cy + ry * _UNIT_SIN))
 
 def convert_line_to_coordinates(element):
     """Convert line to coordinate list."""
@@ -1017,109 +1114,80 @@ def convert_polygon_to_coordinates(element):
     if not points_str:
         return []
     
-    coords = []
-    parts = points_str.split()
-    for i in range(0, len(parts), 2):
-        if i + 1 < len(parts):
-            x = float(parts[i])
-            y = float(parts[i + 1])
-            coords.append((x, y))
+    # Numbers may be separated by commas, whitespace or just their sign;
+    # anything else means the list is malformed
+    if _SVG_NUMBER.sub('', points_str).replace(',', ' ').strip():
+        raise ValueError(f"Invalid polygon points: {points_str!r}")
+    
+    values = np.array(_SVG_NUMBER.findall(points_str), dtype=np.float64)
+    coords = values[:len(values) - len(values) % 2].reshape(-1, 2)
     
     # Close polygon if it's a polygon (not polyline)
-    if element['tag'] == 'polygon' and coords and coords[0] != coords[-1]:
-        coords.append(coords[0])
+    if element['tag'] == 'polygon' and len(coords) and not np.array_equal(coords[0], coords[-1]):
+        coords = np.vstack([coords, coords[:1]])
     
     return coords
 
 def calculate_shape_width(coords):
-    """Calculate the width of a shape for stitch type selection."""
-    if not coords:
+    """Calculate the width of a shape (in mm) for stitch type selection."""
+    if len(coords) == 0:
         return 0
     
-    min_x = min(x for x, y in coords)
-    max_x = max(x for x, y in coords)
-    min_y = min(y for x, y in coords)
-    max_y = max(y for x, y in coords)
+    coords = np.asarray(coords)
     
     # Calculate average width (simplified)
-    width = max_x - min_x
-    height = max_y - min_y
+    width, height = (coords.max(axis=0) - coords.min(axis=0)).tolist()
     if width == 0 and height == 0:
         return 0
-    return (width + height) / 2
+    return (width + height) / 2 / PES_UNITS_PER_MM
 
 def generate_running_stitches(coords, stitch_length=2.5):
-    """Generate running stitches along a path with specified stitch length."""
+    """Generate running stitches along a path with specified stitch length.
+    
+    Coordinates are in PES units and stitch_length is in millimeters.
+    """
     if len(coords) < 2:
-        return []
+        return np.empty((0, 2), dtype=np.int32)
     
-    running_stitches = []
-    current_pos = coords[0]
-    running_stitches.append(current_pos)
+    # View each (x, y) pair as x + yj so vector math is plain complex arithmetic
+    points = np.ascontiguousarray(coords, dtype=np.float64).view(np.complex128).ravel()
+    stitch_length = stitch_length * PES_UNITS_PER_MM
     
-    for i in range(1, len(coords)):
-        target_pos = coords[i]
-        distance = math.sqrt((target_pos[0] - current_pos[0])**2 + (target_pos[1] - current_pos[1])**2)
-        
-        if distance > stitch_length:
-            # Need to add intermediate stitches
-            num_stitches = int(distance / stitch_length)
-            for j in range(1, num_stitches + 1):
-                t = j / (num_stitches + 1)
-                x = current_pos[0] + (target_pos[0] - current_pos[0]) * t
-                y = current_pos[1] + (target_pos[1] - current_pos[1]) * t
-                running_stitches.append((x, y))
-        
-        running_stitches.append(target_pos)
-        current_pos = target_pos
+    # Segment vectors and lengths for the whole path at once
+    segments = np.diff(points)
+    distances = np.abs(segments)
+    
+    # Long segments get intermediate stitches; every segment ends on its target point
+    intermediate = np.where(distances > stitch_length, np.floor(distances / stitch_length), 0)
+    steps = intermediate.astype(np.intp) + 1
+    
+    # Interpolation parameter t = j / steps for j = 1..steps within each segment
+    segment_idx = np.repeat(np.arange(len(segments)), steps)
+    segment_start = np.cumsum(steps) - steps
+    j = np.arange(len(segment_idx)) - segment_start[segment_idx] + 1
+    t = j / steps[segment_idx]
+    
+    running_stitches = points[:-1][segment_idx] + segments[segment_idx] * t
+    running_stitches = np.concatenate([points[:1], running_stitches])
     
-    return running_stitches
+    return np.rint(running_stitches.view(np.float64).reshape(-1, 2)).astype(np.int32)
 
 def create_simple_pes_file(svg_content):
     """Create a professional PES file with proper structure and stitch data."""
     try:
-        # Parse SVG to extract basic shape information
-        elements = extract_svg_elements(svg_content)
-        if not elements:
-            # Create a default design if no elements found
+        # Reuse the stitch blocks generated for the pyembroidery path
+        stitch_blocks, colors = compute_stitch_blocks(svg_content)
+        if not stitch_blocks:
+            # Create a default design if no stitches were generated
             return create_default_pes_file()
         
-        # Generate stitch data from SVG elements
-        stitch_data = []
-        colors = set()
+        stitch_data = np.concatenate([block['stitches'] for block in stitch_blocks], axis=0)
         
-        for element in elements:
-            coords = convert_element_to_coordinates(element)
-            if not coords:
-                continue
-            
-            # Scale coordinates to embroidery size (100x100mm default)
-            coords = scale_coordinates(coords, 100, 100)
-            
-            # Generate stitches based on element type
-            fill_color = element.get('fill', '#000000')
-            stroke_color = element.get('stroke', '#000000')
-            stroke_width = element.get('stroke_width', 1)
-            
-            # Process fill
-            if fill_color and fill_color != 'none':
-                fill_stitches = generate_fill_stitches(coords)
-                if fill_stitches:
-                    stitch_data.extend(fill_stitches)
-                    colors.add(fill_color)
-            
-            # Process stroke
-            if stroke_color and stroke_color != 'none' and stroke_width > 0:
-                stroke_stitches = generate_running_stitches(coords, 2.5)
-                if stroke_stitches:
-                    stitch_data.extend(stroke_stitches)
-                    colors.add(stroke_color)
-        
-        if not stitch_data:
-            return create_default_pes_file()
+        # Coordinates are written unsigned; satin edges can overhang the origin
+        stitch_data = stitch_data - np.minimum(stitch_data.min(axis=0), 0)
         
         # Create PES file with proper structure
-        return create_pes_file_with_stitches(stitch_data, list(colors))
+        return create_pes_file_with_stitches(stitch_data, colors)
         
     except Exception as e:
         print(f"Error creating PES file: {e}")
@@ -1127,26 +1195,18 @@ def create_simple_pes_file(svg_content):
 
 def create_default_pes_file():
     """Create a default PES file with a simple design."""
-    # Create a simple square design
+    # Create a simple 100mm square design
+    size = 100 * PES_UNITS_PER_MM
     stitches = [
-        (0, 0), (100, 0), (100, 100), (0, 100), (0, 0)
+        (0, 0), (size, 0), (size, size), (0, size), (0, 0)
     ]
     return create_pes_file_with_stitches(stitches, ['#000000'])
 
 def create_pes_file_with_stitches(stitches, colors):
-    """Create a PES file with actual stitch data."""
+    """Create a PES file with actual stitch data (coordinates in PES units)."""
     try:
-        # PES file structure
-        pes_data = bytearray()
-        
-        # PES header
-        pes_data.extend(b'#PES0060')  # PES version 6.0
-        pes_data.extend(b'\x00\x00\x00\x00')  # Reserved
-        pes_data.extend(b'\x01\x00')  # Hoop count
-        pes_data.extend(b'\x00\x00')  # Reserved
-        pes_data.extend(b'\x64\x00')  # Width (100mm)
-        pes_data.extend(b'\x64\x00')  # Height (100mm)
-        pes_data.extend(b'\x00\x00\x00\x00')  # Reserved
+        # PES file structure, starting from the fixed header
+        pes_data = bytearray(_PES_HEADER)
         
         # Thread information
         for i, color in enumerate(colors):
@@ -1155,21 +1215,18 @@ def create_pes_file_with_stitches(stitches, colors):
         # Stitch data
         pes_data.extend(b'\x00\x00')  # Start of stitch data
         
-        # Add stitches
-        for i, (x, y) in enumerate(stitches):
-            # Convert to PES coordinates (0.1mm units)
-            x_pes = int(x * 10)
-            y_pes = int(y * 10)
-            
-            # Add stitch command
-            if i == 0:
-                pes_data.extend(b'\x00\x01')  # First stitch
-            else:
-                pes_data.extend(b'\x00\x02')  # Regular stitch
+        # Add stitches (coordinates are already PES units (0.1mm))
+        coords = np.asarray(stitches, dtype=np.int64).reshape(-1, 2)
+        if len(coords):
+            if coords.min() < 0 or coords.max() > 0xFFFF:
+                raise ValueError("stitch coordinates out of range for PES")
             
-            # Add coordinates (little-endian)
-            pes_data.extend(struct.pack('<H', x_pes))
-            pes_data.extend(struct.pack('<H', y_pes))
+            # Command word followed by little-endian x and y for each stitch
+            records = np.empty((len(coords), 3), dtype='<u2')
+            records[:, 0] = 0x0200  # Regular stitch
+            records[0, 0] = 0x0100  # First stitch
+            records[:, 1:] = coords
+            pes_data.extend(records.tobytes())
         
         # End of stitch data
         pes_data.extend(b'\x00\x00')
@@ -1181,47 +1238,63 @@ def create_pes_file_with_stitches(stitches, colors):
         # Return a minimal PES file to avoid recursion
         return b'#PES0060\x00\x00\x00\x00\x01\x00\x64\x00\x64\x00\x00\x00\x00\x00\x00\x00'
 
+@lru_cache(maxsize=1)
+def read_pes_pattern(pes_content):
+    """Parse a real PES file with pyembroidery, or return None.
+    
+    Only files with a PEC section offset are real PES; the minimal files
+    written by create_pes_file_with_stitches leave it zeroed. The last
+    result is cached because the stitch count and dimensions both use it.
+    """
+    if not PYEMBROIDERY_AVAILABLE or len(pes_content) < _PES_PREFIX.size:
+        return None
+    
+    signature, pec_offset = _PES_PREFIX.unpack_from(pes_content, 0)
+    if signature != b'#PES' or not 0 < pec_offset < len(pes_content):
+        return None
+    
+    try:
+        return pyembroidery.read_pes(BytesIO(pes_content))
+    except Exception:
+        return None  # Fall back to manual parsing
+
 def count_stitches_in_pes(pes_content):
     """Count actual stitches in PES file using industry standard methods."""
     try:
-        if not pes_content or len(pes_content) < 8:
+        if not pes_content or len(pes_content) < _PES_PREFIX.size:
             return 0
         
-        # Check if it's a valid PES file
+        # Check if it's a valid PES file (read_pes_pattern reads the full prefix)
         if not pes_content.startswith(b'#PES'):
             return 0
         
+        # Method 1: If pyembroidery can parse the file, its count is authoritative
+        pattern = read_pes_pattern(pes_content)
+        if pattern is not None:
+            return len(pattern.stitches)
+        
         stitch_count = 0
         
-        # Method 1: Count stitch commands in PES format
+        # Method 2: Count stitch commands in PES format
         # Look for coordinate patterns in the PES file
-        i = 0
-        while i < len(pes_content) - 4:
-            # Look for patterns that look like coordinates (2-byte values)
-            try:
-                val1 = struct.unpack('<H', pes_content[i:i+2])[0]
-                val2 = struct.unpack('<H', pes_content[i+2:i+4])[0]
-                
-                # Check if these look like reasonable coordinates (0-1000 range)
-                if 0 < val1 < 1000 and 0 < val2 < 1000:
-                    stitch_count += 1
-                    i += 4  # Skip the coordinate pair
-                else:
-                    i += 1
-            except:
-                i += 1
+        data = np.frombuffer(pes_content, dtype=np.uint8)
         
-        # Method 2: If pyembroidery is available, use it for more accurate counting
-        if PYEMBROIDERY_AVAILABLE:
-            try:
-                from io import BytesIO
-                pattern = pyembroidery.EmbPattern()
-                pattern.read_pes(BytesIO(pes_content))
-                pyembroidery_count = len(pattern.stitches)
-                if pyembroidery_count > stitch_count:
-                    stitch_count = pyembroidery_count
-            except:
-                pass  # Fall back to manual counting
+        # Little-endian 2-byte value starting at every byte offset
+        values = data[:-1].astype(np.uint16) | (data[1:].astype(np.uint16) << 8)
+        
+        # Check if these look like reasonable coordinates (0-1000 range)
+        plausible = (values > 0) & (values < 1000)
+        
+        # Offsets where two consecutive values both look like coordinates
+        scan_end = len(pes_content) - 4
+        candidates = np.flatnonzero(plausible[:scan_end] & plausible[2:scan_end + 2])
+        
+        # Each match consumes the coordinate pair, so skip overlapping candidates
+        next_offset = 0
+        for offset in candidates.tolist():
+            if offset >= next_offset:
+                stitch_count += 1
+                next_offset = offset + 4
         
         return max(stitch_count, 0)
         
@@ -1231,32 +1304,21 @@ def count_stitches_in_pes(pes_content):
 
 def assess_embroidery_quality(stitch_count, pes_content):
     """Assess embroidery quality based on stitch count and file analysis."""
+    # Nothing to assess without stitches, so skip reading the header
+    if stitch_count == 0:
+        return {
+            'level': 'invalid',
+            'complexity': 'none',
+            'dimensions': {'width': 0, 'height': 0},
+            'stitch_density': 0
+        }
+    
     try:
         # Calculate dimensions from PES content
         dimensions = extract_pes_dimensions(pes_content)
         
         # Determine complexity based on stitch count
-        if stitch_count == 0:
-            complexity = "none"
-            level = "invalid"
-        elif stitch_count < 20:
-            complexity = "very_simple"
-            level = "basic"
-        elif stitch_count < 100:
-            complexity = "simple"
-            level = "basic"
-        elif stitch_count < 300:
-            complexity = "moderate"
-            level = "good"
-        elif stitch_count < 1000:
-            complexity = "complex"
-            level = "high"
-        elif stitch_count < 3000:
-            complexity = "highly_complex"
-            level = "high"
-        else:
-            complexity = "highly_complex"
-            level = "professional"
+        complexity, level = _QUALITY_BANDS[bisect_right(_QUALITY_BINS, stitch_count)]
         
         # Adjust quality based on dimensions
         if dimensions['width'] > 0 and dimensions['height'] > 0:
@@ -1285,15 +1347,20 @@ def assess_embroidery_quality(stitch_count, pes_content):
         }
 
 def extract_pes_dimensions(pes_content):
-    """Extract dimensions from PES file header."""
+    """Extract dimensions from the PES stitch extents or the minimal header."""
     try:
-        if len(pes_content) < 20:
+        # Real PES files have no dimensions at a fixed header offset, so
+        # measure the stitches instead
+        pattern = read_pes_pattern(pes_content)
+        if pattern is not None and len(pattern.stitches):
+            min_x, min_y, max_x, max_y = pattern.bounds()
+            width = int(max_x - min_x)
+            height = int(max_y - min_y)
+        elif len(pes_content) < 20:
             return {'width': 0, 'height': 0}
-        
-        # PES header structure (simplified)
-        # Width and height are typically at specific offsets
-        width = struct.unpack('<H', pes_content[16:18])[0]
-        height = struct.unpack('<H', pes_content[18:20])[0]
+        else:
+            # Minimal writer header stores width and height at offset 16
+            width, height = _PES_DIMENSIONS.unpack_from(pes_content, 16)
         
         # Convert from PES units to millimeters (approximate)
         # PES uses 0.1mm units
@@ -1311,6 +1378,12 @@ def extract_pes_dimensions(pes_content):
         print(f"Error extracting dimensions: {e}")
         return {'width': 0, 'height': 0}
 
+def _dumps(obj):
+    """Serialize a response body to a JSON string."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj)
+
 def get_cors_headers():
     """Get CORS headers for responses."""
     return {
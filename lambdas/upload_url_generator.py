@@ -1,6 +1,7 @@
 import boto3
 import json
 import os
+import time
 import uuid
 from datetime import datetime
 import logging
@@ -12,6 +13,10 @@ s3_client = boto3.client('s3')
 ssm_client = boto3.client('ssm')
 dynamodb = boto3.resource('dynamodb')
 
+# Cached across warm invocations
+_SHIELD_BUCKET = None
+_STATUS_TABLE = None
+
 def lambda_handler(event, context):
     """
     Generate presigned URL for Shield bucket upload.
@@ -19,14 +24,17 @@ def lambda_handler(event, context):
     This endpoint allows the frontend to upload files directly to Shield S3 bucket
     for malware scanning without touching Lambda compute.
     """
+    global _SHIELD_BUCKET, _STATUS_TABLE
     
     try:
         logger.info("Generating presigned URL for Shield upload")
         
-        # Get Shield bucket from SSM Parameter Store
-        shield_bucket = ssm_client.get_parameter(
-            Name='/urgd/shield/quarantine_bucket_name'
-        )['Parameter']['Value']
+        # Get Shield bucket from SSM Parameter Store (once per container)
+        if _SHIELD_BUCKET is None:
+            _SHIELD_BUCKET = ssm_client.get_parameter(
+                Name='/urgd/shield/quarantine_bucket_name'
+            )['Parameter']['Value']
+        shield_bucket = _SHIELD_BUCKET
         
         logger.info(f"Shield bucket: {shield_bucket}")
         
@@ -42,18 +50,21 @@ def lambda_handler(event, context):
         logger.info(f"Generated request ID: {request_id}")
         logger.info(f"S3 key: {s3_key}")
         
+        now = time.time()
+        timestamp = datetime.utcfromtimestamp(now).isoformat()
+        
         # Create initial status record in DynamoDB
-        status_table_name = os.environ['STATUS_TABLE_NAME']
-        table = dynamodb.Table(status_table_name)
+        if _STATUS_TABLE is None:
+            _STATUS_TABLE = dynamodb.Table(os.environ['STATUS_TABLE_NAME'])
         
-        table.put_item(
+        _STATUS_TABLE.put_item(
             Item={
                 'request_id': request_id,
                 'status': 'uploading',
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': timestamp,
                 'destination_bucket': stitch_processing_bucket,
                 's3_key': s3_key,
-                'ttl': int((datetime.utcnow().timestamp() + (7 * 24 * 60 * 60)))  # 7 days TTL
+                'ttl': int(now) + 7 * 24 * 60 * 60  # 7 days TTL
             }
         )
         
@@ -91,7 +102,7 @@ def lambda_handler(event, context):
                 'fields': presigned_post['fields'],
                 'request_id': request_id,
                 'destination_bucket': stitch_processing_bucket,
-                'upload_timestamp': datetime.utcnow().isoformat(),
+                'upload_timestamp': timestamp,
                 'expires_in': 300,
                 'message': 'Upload directly to this URL using the provided fields'
             })
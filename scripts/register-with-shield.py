@@ -2,23 +2,33 @@
 """
 Register Stitch with Shield
 This script is called during deployment to register Stitch's callback Lambda with Shield.
+Pass --json-only to keep stdout machine-readable (status messages go to stderr).
 """
+import argparse
 import json
 import os
 import sys
 import boto3
 
 def main():
+    parser = argparse.ArgumentParser(description="Register Stitch's callback Lambda with Shield")
+    parser.add_argument('--json-only', action='store_true',
+                        help='print only the JSON response to stdout and send status messages to stderr')
+    args = parser.parse_args()
+    
+    # Keep stdout clean for jq parsing when only JSON is wanted
+    status_out = sys.stderr if args.json_only else sys.stdout
+    
     # Get required environment variables
     callback_arn = os.environ.get('CALLBACK_ARN')
     shield_registration_arn = os.environ.get('SHIELD_REGISTRATION_ARN')
     
     if not callback_arn:
-        print("❌ CALLBACK_ARN environment variable not set")
+        print("❌ CALLBACK_ARN environment variable not set", file=status_out)
         sys.exit(1)
     
     if not shield_registration_arn:
-        print("❌ SHIELD_REGISTRATION_ARN environment variable not set")
+        print("❌ SHIELD_REGISTRATION_ARN environment variable not set", file=status_out)
         sys.exit(1)
     
     try:
@@ -29,34 +39,36 @@ def main():
             'callback_lambda_arn': callback_arn
         }
         
-        # Log to stderr so it doesn't interfere with JSON output
-        print(f"🔍 Registering Stitch with Shield...", file=sys.stderr)
-        print(f"   Callback ARN: {callback_arn}", file=sys.stderr)
-        print(f"   Shield Registration ARN: {shield_registration_arn}", file=sys.stderr)
+        print(f"🔍 Registering Stitch with Shield...", file=status_out)
+        print(f"   Callback ARN: {callback_arn}", file=status_out)
+        print(f"   Shield Registration ARN: {shield_registration_arn}", file=status_out)
         
         # Call Shield registration Lambda
         lambda_client = boto3.client('lambda', region_name='us-west-2')
         response = lambda_client.invoke(
             FunctionName=shield_registration_arn,
-            Payload=json.dumps(payload)
+            Payload=json.dumps(payload, separators=(',', ':')).encode('utf-8')
         )
         
         # Parse response
         result = json.loads(response['Payload'].read())
         
-        # Output only JSON to stdout for jq parsing
-        print(json.dumps(result))
+        # Compact JSON for jq parsing, otherwise pretty-print for reading
+        if args.json_only:
+            print(json.dumps(result))
+        else:
+            print(json.dumps(result, indent=2))
         
         # Check if registration was successful
         if result.get('body', {}).get('registration_successful'):
-            print("✅ Shield registration successful", file=sys.stderr)
+            print("✅ Shield registration successful", file=status_out)
             sys.exit(0)
         else:
-            print("❌ Shield registration failed", file=sys.stderr)
+            print("❌ Shield registration failed", file=status_out)
             sys.exit(1)
             
     except Exception as e:
-        print(f"❌ Error during Shield registration: {str(e)}", file=sys.stderr)
+        print(f"❌ Error during Shield registration: {str(e)}", file=status_out)
         sys.exit(1)
 
 if __name__ == "__main__":